@@ -7,9 +7,24 @@ import io
 import base64
 import logging
 import time
+import hashlib
+from datetime import datetime, timezone
+import tempfile
+import threading
 import jwt
 from typing import *
 from io import BytesIO
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from dataclasses import dataclass, field, fields, is_dataclass
+from functools import lru_cache
+from urllib.parse import quote
 from dotenv import load_dotenv
 import boto3
 from flask import (
@@ -24,6 +39,18 @@ from http import HTTPStatus
 from flask_cors import CORS, cross_origin
 import httpx
 
+# msgspec is locked in the Pipfile. The fallback decoder only keeps ad-hoc
+# environments working and is slower than decoding to plain dicts.
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 load_dotenv()
 
 logging.basicConfig(
@@ -58,6 +85,29 @@ r2_secret_access_key = os.environ["R2_SECRET_ACCESS_KEY"]
 r2_endpoint_url = f"https://{r2_account_id}.r2.cloudflarestorage.com"
 r2_operation_timeout = 3600
 
+# CSV formatting runs off the event loop. Threads by default; set
+# LIBX_SERIALIZE_EXECUTOR=process to spread it across cores where
+# multiprocessing is available.
+serialize_executor_kind = os.environ.get("LIBX_SERIALIZE_EXECUTOR", "thread")
+serialize_workers = int(
+    os.environ.get("LIBX_SERIALIZE_WORKERS", min(4, os.cpu_count() or 1))
+)
+
+# Provider pages are revalidated against this on-disk cache. Set the size
+# to 0 to disable it.
+http_cache_dir = os.environ.get(
+    "LIBX_HTTP_CACHE_DIR", os.path.join(tempfile.gettempdir(), "libx-http")
+)
+http_cache_max_bytes = int(
+    os.environ.get("LIBX_HTTP_CACHE_MAX_BYTES", 128 * 1024 * 1024)
+)
+
+# Bounds for the adaptive playlist fan-out concurrency.
+fanout_initial_concurrency = int(
+    os.environ.get("LIBX_FANOUT_INITIAL_CONCURRENCY", 4)
+)
+fanout_max_concurrency = int(os.environ.get("LIBX_FANOUT_MAX_CONCURRENCY", 32))
+
 app = Flask(__name__, static_folder="../www/libx/dist", static_url_path="")
 app.secret_key = os.urandom(32)
 
@@ -69,11 +119,293 @@ boto = boto3.client(
     region_name="auto",
 )
 
+serialize_executor: Executor = (
+    ProcessPoolExecutor(max_workers=serialize_workers)
+    if serialize_executor_kind == "process"
+    else ThreadPoolExecutor(
+        max_workers=serialize_workers, thread_name_prefix="libx-serialize"
+    )
+)
+
 
 def safeget(d: dict, key: str, default: Optional[Any] = None) -> Any:
     return d[key] if isinstance(d, dict) and key in d else default
 
 
+# Provider payloads, trimmed to the fields we export. Defaults mirror what
+# the export writes for a missing key; an explicit null decodes to None.
+
+
+@dataclass(slots=True)
+class SpotifyArtist:
+    name: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SpotifyAlbumRef:
+    name: Optional[str] = "Unknown"
+
+
+@dataclass(slots=True)
+class SpotifyTrack:
+    name: Optional[str] = "Unknown"
+    uri: Optional[str] = "Unknown"
+    artists: Optional[List[Optional[SpotifyArtist]]] = None
+    album: Optional[SpotifyAlbumRef] = None
+
+
+@dataclass(slots=True)
+class SpotifyTrackItem:
+    track: Optional[SpotifyTrack] = None
+    added_at: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SpotifyAlbumTracks:
+    items: Optional[List[Optional[SpotifyTrack]]] = None
+
+
+@dataclass(slots=True)
+class SpotifyAlbum:
+    name: Optional[str] = "Unknown"
+    uri: Optional[str] = "Unknown"
+    artists: Optional[List[Optional[SpotifyArtist]]] = None
+    tracks: Optional[SpotifyAlbumTracks] = None
+
+
+@dataclass(slots=True)
+class SpotifySavedAlbum:
+    album: Optional[SpotifyAlbum] = None
+    added_at: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SpotifyOwner:
+    id: Optional[str] = None
+    display_name: Optional[str] = "Unknown"
+
+
+@dataclass(slots=True)
+class SpotifyPlaylist:
+    id: Optional[str] = None
+    name: Optional[str] = "Unknown"
+    uri: Optional[str] = "Unknown"
+    owner: Optional[SpotifyOwner] = None
+
+
+@dataclass(slots=True)
+class SpotifyUser:
+    id: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SpotifyPlaylistPage:
+    items: List[Optional[SpotifyPlaylist]] = field(default_factory=list)
+    next: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SpotifyTrackPage:
+    items: List[Optional[SpotifyTrackItem]] = field(default_factory=list)
+    next: Optional[str] = None
+
+
+@dataclass(slots=True)
+class SpotifySavedAlbumPage:
+    items: List[Optional[SpotifySavedAlbum]] = field(default_factory=list)
+    next: Optional[str] = None
+
+
+@dataclass(slots=True)
+class AppleMusicAttributes:
+    name: Optional[str] = "Unknown"
+    artistName: Optional[str] = "Unknown"
+    albumName: Optional[str] = "Unknown"
+    dateAdded: Optional[str] = None
+    canEdit: Optional[bool] = None
+
+
+@dataclass(slots=True)
+class AppleMusicResource:
+    id: Optional[str] = "Unknown"
+    attributes: Optional[AppleMusicAttributes] = None
+
+    @property
+    def added_at(self) -> Optional[str]:
+        return self.attributes.dateAdded if self.attributes else None
+
+
+@dataclass(slots=True)
+class AppleMusicPage:
+    data: List[Optional[AppleMusicResource]] = field(default_factory=list)
+    next: Optional[str] = None
+
+    @property
+    def items(self) -> list:
+        return self.data
+
+
+json_loads = orjson.loads if orjson else json.loads
+
+
+@lru_cache(maxsize=None)
+def payload_converter(tp: Any) -> Callable[[Any], Any]:
+    """Build a function turning decoded JSON into `tp`.
+
+    Used when msgspec is unavailable (or rejects a page). Values of the
+    wrong shape become None instead of raising, like `safeget`.
+    """
+    args = [arg for arg in get_args(tp) if arg is not type(None)]
+    if get_origin(tp) is Union:
+        return payload_converter(args[0])
+
+    if get_origin(tp) is list:
+        convert_item = payload_converter(args[0])
+        return lambda v: (
+            [convert_item(x) for x in v] if isinstance(v, list) else None
+        )
+
+    if is_dataclass(tp):
+        hints = get_type_hints(tp)
+        # Scalars are copied as-is; only nested payloads need converting.
+        scalars = []
+        nested = []
+        for f in fields(tp):
+            hint = hints[f.name]
+            if get_origin(hint) is Union:
+                hint = next(a for a in get_args(hint) if a is not type(None))
+            if get_origin(hint) is list or is_dataclass(hint):
+                nested.append((f.name, payload_converter(hint)))
+            else:
+                scalars.append(f.name)
+
+        def convert(v):
+            if not isinstance(v, dict):
+                return None
+            kwargs = {name: v[name] for name in scalars if name in v}
+            for name, convert_field in nested:
+                if name in v:
+                    kwargs[name] = convert_field(v[name])
+            return tp(**kwargs)
+
+        return convert
+
+    return lambda v: v if isinstance(v, tp) else None
+
+
+@lru_cache(maxsize=None)
+def payload_decoder(tp: Any) -> Any:
+    return msgspec.json.Decoder(tp)
+
+
+def decode_payload(content: bytes, tp: Any) -> Any:
+    """Decode a provider response body straight into `tp`."""
+    if msgspec:
+        try:
+            return payload_decoder(tp).decode(content)
+        except msgspec.ValidationError as e:
+            logger.warning(f"Falling back to untyped decoding: {e}")
+    return payload_converter(tp)(json_loads(content))
+
+
+spotify_sources = ("playlists", "tracks", "albums")
+apple_music_sources = ("playlists", "songs", "albums")
+
+
+@dataclass(frozen=True)
+class ExportOptions:
+    """Which parts of a library to export. The defaults export everything."""
+
+    sources: Optional[Tuple[str, ...]] = None
+    playlist_ids: Tuple[str, ...] = ()
+    owned_only: bool = False
+    added_since: Optional[datetime] = None
+
+    def includes(self, source: str) -> bool:
+        return self.sources is None or source in self.sources
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def parse_export_options(
+    args: Mapping[str, str], sources: Sequence[str]
+) -> ExportOptions:
+    """Read export filters from query parameters.
+
+    sources=playlists,tracks  only export these sources
+    playlists=<id>,<id>       only export these playlists
+    owned=true                only export playlists the user owns
+    since=2024-01-01          only export items added on or after this time
+    """
+
+    def split(value: Optional[str]) -> list:
+        return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+    selected = None
+    if args.get("sources") is not None:
+        selected = tuple(sorted(set(split(args.get("sources")))))
+        if not selected:
+            raise ValueError(
+                f"No sources selected. Expected any of: {', '.join(sources)}"
+            )
+        unknown = set(selected) - set(sources)
+        if unknown:
+            raise ValueError(
+                f"Unknown sources: {', '.join(sorted(unknown))}. "
+                f"Expected any of: {', '.join(sources)}"
+            )
+
+    since = None
+    if args.get("since"):
+        since = parse_timestamp(args.get("since"))
+        if since is None:
+            raise ValueError(f"Invalid since date: {args.get('since')}")
+
+    return ExportOptions(
+        sources=selected,
+        playlist_ids=tuple(dict.fromkeys(split(args.get("playlists")))),
+        owned_only=(args.get("owned") or "").lower() in ("1", "true", "yes"),
+        added_since=since,
+    )
+
+
+async def filter_added_since(
+    pages: AsyncIterator[list],
+    since: Optional[datetime],
+    newest_first: bool = False,
+):
+    """Drop items added before `since`.
+
+    For endpoints that list newest items first, paging stops at the first
+    older item instead of crawling the rest of the history.
+    """
+    try:
+        async for items in pages:
+            if since is None:
+                yield items
+                continue
+            kept = []
+            exhausted = False
+            for item in items:
+                added_at = parse_timestamp(item.added_at) if item else None
+                if added_at is None or added_at >= since:
+                    kept.append(item)
+                else:
+                    exhausted = newest_first
+            if kept:
+                yield kept
+            if exhausted:
+                break
+    finally:
+        await pages.aclose()
+
+
 def get_spotify_token(code: str) -> dict:
     spotify_token_url = "https://accounts.spotify.com/api/token"
     try:
@@ -187,156 +519,680 @@ def get_apple_music_user_token(code: str) -> dict:
         raise
 
 
-async def fetch_url(client, url, headers):
+class SingleFlight:
+    """Collapses concurrent calls that share a key into a single execution.
+
+    The first caller does the work; callers arriving while it is in flight
+    wait for it and share its result or exception. Works across threads and
+    event loops, since each download request runs its own loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            # Running futures can't be cancelled by a departing follower.
+            future.set_running_or_notify_cancel()
+            return future, True
+
+    def _settle(
+        self,
+        key: Hashable,
+        future: Future,
+        result: Any = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        with self._lock:
+            del self._calls[key]
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            future.set_exception(
+                RuntimeError(f"In-flight call aborted: {error!r}")
+            )
+
+    def do(self, key: Hashable, fn: Callable, *args) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable, *args) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            result = await fn(*args)
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+
+# Identical exports (same user and filters) and identical upstream page
+# fetches that overlap in time are only run once.
+export_flights = SingleFlight()
+page_flights = SingleFlight()
+
+# Headers that describe the wire encoding rather than a decoded body.
+hop_headers = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+class DiskLRUCache:
+    """Size-capped, least-recently-used byte store backed by a directory.
+
+    Each entry is one file holding a JSON metadata line followed by the raw
+    body. Recency is tracked in memory and mirrored to file mtimes so a
+    restarted process picks up where the last one left off. Entries hold
+    private library data, so the directory and files are owner-only.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        # The directory may predate this process with looser permissions.
+        os.chmod(path, 0o700)
+        entries = []
+        for name in os.listdir(path):
+            try:
+                stat = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._sizes[name] = size
+            self._total += size
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        filepath = os.path.join(self.path, key)
+        try:
+            with open(filepath, "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+            os.utime(filepath)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+        return meta, body
+
+    def set(self, key: str, meta: dict, body: bytes) -> None:
+        filepath = os.path.join(self.path, key)
+        data = json.dumps(meta).encode() + b"\n" + body
+        if len(data) > self.max_bytes:
+            return
+        tmp = f"{filepath}.{threading.get_ident()}.tmp"
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, filepath)
+        except OSError as e:
+            logger.error(f"Error writing HTTP cache entry {key}: {e}")
+            return
+        with self._lock:
+            self._total += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.path, key))
+            except OSError:
+                pass
+
+
+# Stable identity of the user an export runs for, set once it is known.
+# Bearer tokens rotate, so cached pages are keyed by this instead.
+http_cache_user: ContextVar[Optional[str]] = ContextVar(
+    "http_cache_user", default=None
+)
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """Revalidates GETs with `If-None-Match`/`If-Modified-Since`.
+
+    Bodies are stored per URL and per user. A 304 from upstream is answered
+    with the stored body as a regular 200, so callers never see the
+    difference. Every request still reaches upstream with its current
+    credentials, so a revoked token gets a 401, not a cached page.
+    """
+
+    def __init__(
+        self, transport: httpx.AsyncBaseTransport, cache: DiskLRUCache
+    ):
+        self._transport = transport
+        self._cache = cache
+
+    @staticmethod
+    def cache_key(request: httpx.Request) -> Optional[str]:
+        """Key by URL and user, or None when the user isn't known."""
+        # Apple's Authorization header is a developer token minted for each
+        # download; the Music-User-Token is what identifies the user.
+        user = request.headers.get("Music-User-Token") or http_cache_user.get()
+        if not user:
+            return None
+        return hashlib.sha256(f"{request.url}\0{user}".encode()).hexdigest()
+
+    async def handle_async_request(
+        self, request: httpx.Request
+    ) -> httpx.Response:
+        key = self.cache_key(request) if request.method == "GET" else None
+        if key is None:
+            return await self._transport.handle_async_request(request)
+
+        # Disk I/O runs on a worker thread so it can't stall the event loop.
+        entry = await asyncio.to_thread(self._cache.get, key)
+        if entry:
+            meta, body = entry
+            if meta.get("etag"):
+                request.headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                request.headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = await self._transport.handle_async_request(request)
+
+        if entry and response.status_code == HTTPStatus.NOT_MODIFIED:
+            await response.aclose()
+            return httpx.Response(
+                HTTPStatus.OK,
+                headers=meta["headers"],
+                content=body,
+                request=request,
+                extensions=response.extensions,
+            )
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code != HTTPStatus.OK or not (etag or last_modified):
+            return response
+
+        body = await response.aread()
+        headers = [
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() not in hop_headers
+        ]
+        await asyncio.to_thread(
+            self._cache.set,
+            key,
+            {"etag": etag, "last_modified": last_modified, "headers": headers},
+            body,
+        )
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=body,
+            request=request,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class CoalescingTransport(httpx.AsyncBaseTransport):
+    """Shares one upstream response between identical in-flight GETs."""
+
+    def __init__(
+        self, transport: httpx.AsyncBaseTransport, flights: SingleFlight
+    ):
+        self._transport = transport
+        self._flights = flights
+
+    async def handle_async_request(
+        self, request: httpx.Request
+    ) -> httpx.Response:
+        if request.method != "GET":
+            return await self._transport.handle_async_request(request)
+
+        key = (
+            str(request.url),
+            request.headers.get("Authorization"),
+            request.headers.get("Music-User-Token"),
+        )
+        status_code, headers, body = await self._flights.do_async(
+            key, self._fetch, request
+        )
+        return httpx.Response(
+            status_code, headers=headers, content=body, request=request
+        )
+
+    async def _fetch(self, request: httpx.Request) -> tuple:
+        response = await self._transport.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        headers = [
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() not in hop_headers
+        ]
+        return response.status_code, headers, body
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def new_http_cache() -> Optional[DiskLRUCache]:
+    if http_cache_max_bytes <= 0:
+        return None
     try:
-        response = await client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        logger.error(f"Error fetching URL {url}: {e}")
+        return DiskLRUCache(http_cache_dir, http_cache_max_bytes)
+    except OSError as e:
+        # e.g. the directory exists but belongs to another account.
+        logger.error(f"HTTP cache disabled, can't use {http_cache_dir}: {e}")
         return None
 
 
-async def get_spotify_playlists(access_token: str) -> list:
-    async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"Bearer {access_token}"}
-        data = await fetch_url(
-            client,
-            f"{spotify_api_base_url}/me/playlists?fields=items(name,owner(display_name),uri,id)",
-            headers,
+http_cache = new_http_cache()
+
+
+def new_http_client(
+    limits: httpx.Limits = httpx.Limits(
+        max_connections=100, max_keepalive_connections=20
+    ),
+    **kwargs,
+) -> httpx.AsyncClient:
+    """Build the client used for provider API calls."""
+    transport = httpx.AsyncHTTPTransport(limits=limits)
+    if http_cache:
+        transport = CachingTransport(transport, http_cache)
+    transport = CoalescingTransport(transport, page_flights)
+    return httpx.AsyncClient(transport=transport, **kwargs)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit driven by observed latency and throttling.
+
+    The limit grows by roughly one per round trip while short-term latency
+    stays within `tolerance` of the baseline latency, and is multiplied by
+    `backoff` on a 429, a timeout or a latency spike. Decreases happen at
+    most once per round trip so a burst of errors from requests that were
+    already in flight only counts once.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        tolerance: float = 2.0,
+        backoff: float = 0.5,
+        retries: int = 3,
+        history: int = 256,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.retries = retries
+        self.inflight = 0
+        self.peak = 0
+        self.throttled = 0
+        self.requests = 0
+        self.history: deque = deque(maxlen=history)
+        self._started = time.monotonic()
+        self._long_latency: Optional[float] = None
+        self._short_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def get(self, client, url: str, headers: dict) -> httpx.Response:
+        """GET `url` once a slot is free, retrying throttled attempts.
+
+        Retries wait for the response's Retry-After, or back off
+        exponentially after a timeout or a 429 without one.
+        """
+        for attempt in range(self.retries + 1):
+            async with self._cond:
+                await self._cond.wait_for(
+                    lambda: self.inflight < int(self.limit)
+                )
+                self.inflight += 1
+                self.peak = max(self.peak, self.inflight)
+
+            started = time.monotonic()
+            response = None
+            try:
+                response = await client.get(url, headers=headers)
+            except httpx.TimeoutException:
+                self._observe(time.monotonic() - started, throttled=True)
+                if attempt == self.retries:
+                    raise
+            finally:
+                async with self._cond:
+                    self.inflight -= 1
+                    self._cond.notify_all()
+
+            if response is not None:
+                throttled = response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+                self._observe(time.monotonic() - started, throttled=throttled)
+                if not throttled or attempt == self.retries:
+                    return response
+            await asyncio.sleep(self._retry_after(response, attempt))
+
+    @staticmethod
+    def _retry_after(response: Optional[httpx.Response], attempt: int) -> float:
+        headers = response.headers if response is not None else {}
+        try:
+            delay = float(headers.get("Retry-After", ""))
+        except ValueError:
+            delay = 2**attempt
+        return min(delay, 30.0)
+
+    def _observe(self, latency: float, throttled: bool) -> None:
+        now = time.monotonic()
+        self.requests += 1
+        if not throttled:
+            if self._long_latency is None:
+                self._long_latency = self._short_latency = latency
+            self._short_latency += 0.3 * (latency - self._short_latency)
+
+        spike = (
+            self._long_latency is not None
+            and self._short_latency > self._long_latency * self.tolerance
+        )
+        if not throttled and not spike:
+            # The baseline follows the fastest round trips and only drifts
+            # up while latency is healthy, so queueing that builds slowly
+            # is not absorbed into it.
+            if latency < self._long_latency:
+                self._long_latency = latency
+            else:
+                self._long_latency += 0.01 * (latency - self._long_latency)
+        if throttled or spike:
+            self.throttled += throttled
+            if now - self._last_decrease > (self._short_latency or latency):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+                # Restart the short-term window at the new operating point.
+                self._short_latency = self._long_latency
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        self.history.append(
+            {
+                "t": round(now - self._started, 3),
+                "limit": round(self.limit, 2),
+                "latency": round(latency, 4),
+                "outcome": (
+                    "throttled" if throttled else "slow" if spike else "ok"
+                ),
+            }
         )
-        return data.get("items", []) if data else []
 
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "peak": self.peak,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "latency": (
+                round(self._long_latency, 4) if self._long_latency else None
+            ),
+            "history": list(self.history),
+        }
 
-async def get_saved_tracks(access_token: str) -> list:
-    async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"Bearer {access_token}"}
-        saved_tracks = []
-        url = f"{spotify_api_base_url}/me/tracks"
-        while url:
-            data = await fetch_url(client, url, headers)
-            if not data:
-                break
-            saved_tracks.extend(data["items"])
-            url = data.get("next")
-        return saved_tracks
-
-
-async def get_saved_albums(access_token: str) -> list:
-    async with httpx.AsyncClient() as client:
-        headers = {"Authorization": f"Bearer {access_token}"}
-        saved_albums = []
-        url = f"{spotify_api_base_url}/me/albums"
-        while url:
-            data = await fetch_url(client, url, headers)
-            if not data:
-                break
-            saved_albums.extend(data["items"])
-            url = data.get("next")
-        return saved_albums
 
+# Final state of recent playlist fan-outs, served by /api/metrics.
+fanout_metrics: deque = deque(maxlen=50)
 
-async def get_playlist_tracks(access_token: str, playlist_id: str) -> list:
+
+async def fetch_url(client, url, headers, payload_type, limiter=None):
     try:
-        async with httpx.AsyncClient() as client:
-            headers = {"Authorization": f"Bearer {access_token}"}
-            url = f"{spotify_api_base_url}/playlists/{playlist_id}/tracks"
-            tracks = []
-            while url:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                tracks.extend(data.get("items", []))
-                url = data.get("next")
-            return tracks
+        if limiter:
+            response = await limiter.get(client, url, headers)
+        else:
+            response = await client.get(url, headers=headers)
+        response.raise_for_status()
+        return decode_payload(response.content, payload_type)
     except Exception as e:
-        logger.error(f"Error fetching playlist tracks for {playlist_id}: {e}")
-        return []
+        logger.error(f"Error fetching URL {url}: {e}")
+        return None
 
 
-async def get_apple_music_playlists(user_token: str, developer_token: str) -> list:
-    """Fetch user's Apple Music library playlists"""
-    async with httpx.AsyncClient() as client:
-        headers = {
-            "Authorization": f"Bearer {developer_token}",
-            "Music-User-Token": user_token
-        }
-        try:
-            data = await fetch_url(
-                client,
-                f"{apple_music_api_base_url}/me/library/playlists",
-                headers,
-            )
-            return data.get("data", []) if data else []
-        except Exception as e:
-            logger.error(f"Error fetching Apple Music playlists: {e}")
-            return []
+async def iter_pages(
+    client,
+    url: str,
+    headers: dict,
+    page_type: type,
+    limiter: Optional[AdaptiveLimiter] = None,
+):
+    """Yield the items of each page of a paginated endpoint, following `next`."""
+    while url:
+        page = await fetch_url(client, url, headers, page_type, limiter)
+        if not page:
+            break
+        yield page.items
+        url = page.next
+
+
+async def get_spotify_playlists(client, access_token: str) -> list:
+    headers = {"Authorization": f"Bearer {access_token}"}
+    data = await fetch_url(
+        client,
+        f"{spotify_api_base_url}/me/playlists?fields=items(name,owner(id,display_name),uri,id)",
+        headers,
+        SpotifyPlaylistPage,
+    )
+    return [playlist for playlist in data.items if playlist] if data else []
+
+
+async def get_spotify_playlist(
+    client, access_token: str, playlist_id: str
+) -> Optional[SpotifyPlaylist]:
+    headers = {"Authorization": f"Bearer {access_token}"}
+    # IDs can come straight from the query string.
+    playlist_id = quote(playlist_id, safe="")
+    return await fetch_url(
+        client,
+        f"{spotify_api_base_url}/playlists/{playlist_id}?fields=name,owner(id,display_name),uri,id",
+        headers,
+        SpotifyPlaylist,
+    )
 
 
-async def get_apple_music_library_songs(user_token: str, developer_token: str) -> list:
-    """Fetch user's Apple Music library songs"""
-    async with httpx.AsyncClient() as client:
-        headers = {
-            "Authorization": f"Bearer {developer_token}",
-            "Music-User-Token": user_token
-        }
-        songs = []
-        url = f"{apple_music_api_base_url}/me/library/songs"
-        while url:
-            try:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                songs.extend(data.get("data", []))
-                url = data.get("next")
-            except Exception as e:
-                logger.error(f"Error fetching Apple Music library songs: {e}")
-                break
-        return songs
+async def get_spotify_user(client, access_token: str) -> Optional[SpotifyUser]:
+    headers = {"Authorization": f"Bearer {access_token}"}
+    return await fetch_url(
+        client, f"{spotify_api_base_url}/me", headers, SpotifyUser
+    )
 
 
-async def get_apple_music_library_albums(user_token: str, developer_token: str) -> list:
-    """Fetch user's Apple Music library albums"""
-    async with httpx.AsyncClient() as client:
-        headers = {
-            "Authorization": f"Bearer {developer_token}",
-            "Music-User-Token": user_token
-        }
-        albums = []
-        url = f"{apple_music_api_base_url}/me/library/albums"
-        while url:
-            try:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                albums.extend(data.get("data", []))
-                url = data.get("next")
-            except Exception as e:
-                logger.error(f"Error fetching Apple Music library albums: {e}")
-                break
-        return albums
+async def get_selected_spotify_playlists(
+    client,
+    access_token: str,
+    options: ExportOptions,
+    user_id: Optional[str] = None,
+) -> list:
+    """Resolve the playlists to export, applying the playlist filters.
+
+    `user_id` is required to filter owned playlists.
+    """
+    if options.playlist_ids:
+        playlists = await asyncio.gather(
+            *(
+                get_spotify_playlist(client, access_token, playlist_id)
+                for playlist_id in options.playlist_ids
+            )
+        )
+        playlists = [playlist for playlist in playlists if playlist]
+    else:
+        playlists = await get_spotify_playlists(client, access_token)
+    # Tracks are fetched by ID, so there is nothing to export without one.
+    playlists = [playlist for playlist in playlists if playlist.id]
+
+    if options.owned_only:
+        if not user_id:
+            raise ValueError("A user ID is required to filter owned playlists")
+        playlists = [
+            playlist
+            for playlist in playlists
+            if playlist.owner and playlist.owner.id == user_id
+        ]
+    return playlists
+
+
+def iter_saved_tracks(client, access_token: str) -> AsyncIterator[list]:
+    headers = {"Authorization": f"Bearer {access_token}"}
+    url = f"{spotify_api_base_url}/me/tracks"
+    return iter_pages(client, url, headers, SpotifyTrackPage)
+
+
+def iter_saved_albums(client, access_token: str) -> AsyncIterator[list]:
+    headers = {"Authorization": f"Bearer {access_token}"}
+    url = f"{spotify_api_base_url}/me/albums"
+    return iter_pages(client, url, headers, SpotifySavedAlbumPage)
+
+
+def iter_playlist_tracks(
+    client,
+    access_token: str,
+    playlist_id: str,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> AsyncIterator[list]:
+    headers = {"Authorization": f"Bearer {access_token}"}
+    playlist_id = quote(playlist_id, safe="")
+    url = f"{spotify_api_base_url}/playlists/{playlist_id}/tracks"
+    return iter_pages(client, url, headers, SpotifyTrackPage, limiter)
+
+
+def apple_music_headers(user_token: str, developer_token: str) -> dict:
+    return {
+        "Authorization": f"Bearer {developer_token}",
+        "Music-User-Token": user_token,
+    }
+
+
+async def get_apple_music_playlists(
+    client, user_token: str, developer_token: str
+) -> list:
+    """Fetch user's Apple Music library playlists"""
+    headers = apple_music_headers(user_token, developer_token)
+    try:
+        data = await fetch_url(
+            client,
+            f"{apple_music_api_base_url}/me/library/playlists",
+            headers,
+            AppleMusicPage,
+        )
+        return [playlist for playlist in data.data if playlist] if data else []
+    except Exception as e:
+        logger.error(f"Error fetching Apple Music playlists: {e}")
+        return []
 
 
-async def get_apple_music_playlist_tracks(user_token: str, developer_token: str, playlist_id: str) -> list:
-    """Fetch tracks from a specific Apple Music playlist"""
-    async with httpx.AsyncClient() as client:
-        headers = {
-            "Authorization": f"Bearer {developer_token}",
-            "Music-User-Token": user_token
-        }
-        tracks = []
-        url = f"{apple_music_api_base_url}/me/library/playlists/{playlist_id}/tracks"
-        while url:
-            try:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                tracks.extend(data.get("data", []))
-                url = data.get("next")
-            except Exception as e:
-                logger.error(f"Error fetching Apple Music playlist tracks: {e}")
-                break
-        return tracks
+async def get_apple_music_playlist(
+    client, user_token: str, developer_token: str, playlist_id: str
+) -> Optional[AppleMusicResource]:
+    """Fetch a single Apple Music library playlist"""
+    headers = apple_music_headers(user_token, developer_token)
+    # IDs can come straight from the query string.
+    playlist_id = quote(playlist_id, safe="")
+    data = await fetch_url(
+        client,
+        f"{apple_music_api_base_url}/me/library/playlists/{playlist_id}",
+        headers,
+        AppleMusicPage,
+    )
+    if not data:
+        return None
+    return next((playlist for playlist in data.data if playlist), None)
+
+
+async def get_selected_apple_music_playlists(
+    client, user_token: str, developer_token: str, options: ExportOptions
+) -> list:
+    """Resolve the playlists to export, applying the playlist filters."""
+    if options.playlist_ids:
+        playlists = []
+        for playlist_id in options.playlist_ids:
+            playlist = await get_apple_music_playlist(
+                client, user_token, developer_token, playlist_id
+            )
+            if playlist:
+                playlists.append(playlist)
+    else:
+        playlists = await get_apple_music_playlists(
+            client, user_token, developer_token
+        )
+    # Tracks are fetched by ID, so there is nothing to export without one.
+    playlists = [playlist for playlist in playlists if playlist.id]
+
+    if options.owned_only:
+        # Only playlists the user created are editable.
+        playlists = [
+            playlist
+            for playlist in playlists
+            if playlist.attributes and playlist.attributes.canEdit
+        ]
+    return playlists
+
+
+def iter_apple_music_library_songs(
+    client, user_token: str, developer_token: str
+) -> AsyncIterator[list]:
+    """Page through user's Apple Music library songs"""
+    headers = apple_music_headers(user_token, developer_token)
+    url = f"{apple_music_api_base_url}/me/library/songs"
+    return iter_pages(client, url, headers, AppleMusicPage)
+
+
+def iter_apple_music_library_albums(
+    client, user_token: str, developer_token: str
+) -> AsyncIterator[list]:
+    """Page through user's Apple Music library albums"""
+    headers = apple_music_headers(user_token, developer_token)
+    url = f"{apple_music_api_base_url}/me/library/albums"
+    return iter_pages(client, url, headers, AppleMusicPage)
+
+
+def iter_apple_music_playlist_tracks(
+    client, user_token: str, developer_token: str, playlist_id: str
+) -> AsyncIterator[list]:
+    """Page through tracks from a specific Apple Music playlist"""
+    headers = apple_music_headers(user_token, developer_token)
+    playlist_id = quote(playlist_id, safe="")
+    url = (
+        f"{apple_music_api_base_url}/me/library/playlists/{playlist_id}/tracks"
+    )
+    return iter_pages(client, url, headers, AppleMusicPage)
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    body = json.dumps({"playlist_fanout": list(fanout_metrics)})
+    return Response(body, status=HTTPStatus.OK, mimetype="application/json")
 
 
 @app.route("/")
@@ -357,32 +1213,267 @@ def serve_arbitrary(path: str):
         return send_from_directory(app.static_folder, "index.html")
 
 
-async def fetch_playlists_and_tracks(access_token: str):
-    try:
-        playlists = await get_spotify_playlists(access_token)
+@dataclass(frozen=True)
+class CsvExport:
+    content: str
+    # Data rows, excluding the header.
+    rows: int
+
+
+def serialize_rows(fn: Callable, *args) -> Tuple[str, int]:
+    """Format one page with `fn` and return its CSV text and row count."""
+    rows = fn(*args)
+    return write_csv_rows(rows), len(rows)
+
+
+class CsvPipeline:
+    """Formats pages of library items into CSV text while the crawl continues.
 
-        async def fetch_tracks(playlist):
-            playlist_id = playlist.get("id")
-            list_tracks = await get_playlist_tracks(access_token, playlist_id)
-            return playlist, list_tracks
+    Fetchers `feed` pages into a bounded queue; when it is full they wait,
+    so a slow serializer throttles the crawl instead of buffering it. A few
+    worker tasks hand each page to `executor`, keeping CPU-bound formatting
+    off the event loop. Chunks are stitched back together in key order, so
+    the output matches a sequential export.
 
+    If a page fails to serialize, feeders stop and `join` raises the first
+    error rather than returning a document with rows missing.
+    """
+
+    def __init__(self, executor: Executor, workers: int = 2, backlog: int = 8):
+        self._executor = executor
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=backlog)
+        self._chunks: Dict[tuple, str] = {}
+        self._rows = 0
+        self._error: Optional[Exception] = None
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(workers)
+        ]
+
+    async def feed(
+        self, key: tuple, pages: AsyncIterator[list], fn: Callable, *args
+    ) -> None:
+        """Queue `fn(*args, items)` rows for every page, ordered under `key`."""
+        page = 0
+        try:
+            async for items in pages:
+                if self._error:
+                    break
+                await self._queue.put(((*key, page), fn, (*args, items)))
+                page += 1
+        finally:
+            await pages.aclose()
+
+    async def _work(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            key, fn, args = await self._queue.get()
+            try:
+                # After a failure the rest of the queue is only drained.
+                if self._error is None:
+                    self._chunks[key], rows = await loop.run_in_executor(
+                        self._executor, serialize_rows, fn, *args
+                    )
+                    self._rows += rows
+            except Exception as e:
+                logger.error(f"Error serializing rows for {key}: {e}")
+                self._error = self._error or e
+            finally:
+                self._queue.task_done()
+
+    async def join(self, headers: list) -> CsvExport:
+        """Wait for queued pages and return the CSV document."""
+        try:
+            await self._queue.join()
+        finally:
+            for worker in self._workers:
+                worker.cancel()
+        if self._error:
+            raise self._error
+        content = write_csv_rows([headers]) + "".join(
+            self._chunks[key] for key in sorted(self._chunks)
+        )
+        return CsvExport(content, self._rows)
+
+
+spotify_csv_headers = [
+    "Type",
+    "Playlist Name / Album Name",
+    "Owner / Album Artist",
+    "Playlist URI / Album URI",
+    "Track Name",
+    "Artists",
+    "Album",
+    "Track URI",
+]
+
+
+def write_csv_rows(rows: list) -> str:
+    buff = io.StringIO()
+    csv.writer(buff).writerows(rows)
+    return buff.getvalue()
+
+
+def spotify_artist_names(artists: Optional[list]) -> str:
+    return "+ ".join(
+        filter(None, (artist.name for artist in artists or [] if artist))
+    )
+
+
+def format_spotify_track(track: Optional[SpotifyTrack]) -> list:
+    track = track or SpotifyTrack()
+    return [
+        track.name,
+        spotify_artist_names(track.artists),
+        track.album.name if track.album else "Unknown",
+        track.uri,
+    ]
+
+
+def format_spotify_playlist_rows(
+    playlist: SpotifyPlaylist, items: List[Optional[SpotifyTrackItem]]
+) -> list:
+    owner = playlist.owner.display_name if playlist.owner else "Unknown"
+    prefix = ["Playlist", playlist.name, owner, playlist.uri]
+    return [prefix + format_spotify_track(item.track) for item in items if item]
+
+
+def format_spotify_saved_track_rows(
+    items: List[Optional[SpotifyTrackItem]],
+) -> list:
+    prefix = ["Saved Track", "", "", ""]
+    return [prefix + format_spotify_track(item.track) for item in items if item]
+
+
+def format_spotify_saved_album_rows(
+    items: List[Optional[SpotifySavedAlbum]],
+) -> list:
+    rows = []
+    for album_item in items:
+        if not album_item:
+            continue
+        album = album_item.album or SpotifyAlbum()
+        album_artist = spotify_artist_names(album.artists)
+        tracks = (album.tracks.items if album.tracks else None) or []
+
+        for track in tracks:
+            if not track:
+                continue
+            rows.append(
+                [
+                    "Saved Album",
+                    album.name,
+                    album_artist,
+                    album.uri,
+                    track.name,
+                    spotify_artist_names(track.artists),
+                    album.name,
+                    track.uri,
+                ]
+            )
+    return rows
+
+
+async def export_spotify_library(
+    client,
+    access_token: str,
+    executor: Executor,
+    options: ExportOptions = ExportOptions(),
+) -> CsvExport:
+    """Crawl a Spotify library and return it as CSV.
+
+    Sources left out by `options` are never requested. Raises if the token
+    can't resolve the user, instead of returning an empty export.
+    """
+    user = await get_spotify_user(client, access_token)
+    user_id = user.id if user else None
+    if not user_id:
+        # Usually an expired or revoked token. Every other request would
+        # fail as well and leave nothing but the header row.
+        raise RuntimeError("Could not resolve the Spotify user")
+
+    pipeline = CsvPipeline(executor)
+    since = options.added_since
+
+    async def feed_playlists():
+        playlists = await get_selected_spotify_playlists(
+            client, access_token, options, user_id
+        )
+        # Page fetches across all playlists share one adaptive limit.
+        limiter = AdaptiveLimiter(
+            initial=fanout_initial_concurrency,
+            max_limit=fanout_max_concurrency,
+        )
         results = await asyncio.gather(
-            *(fetch_tracks(playlist) for playlist in playlists),
+            *(
+                pipeline.feed(
+                    (0, index),
+                    filter_added_since(
+                        iter_playlist_tracks(
+                            client, access_token, playlist.id, limiter
+                        ),
+                        since,
+                    ),
+                    format_spotify_playlist_rows,
+                    playlist,
+                )
+                for index, playlist in enumerate(playlists)
+            ),
             return_exceptions=True,
         )
-
-        playlist_tracks = []
         for result in results:
             if isinstance(result, Exception):
                 logger.error(f"Error fetching tracks: {result}")
-                continue
-            playlist, tracks = result
-            playlist_tracks.append((playlist, tracks))
-        return playlist_tracks
 
-    except Exception as e:
-        logger.error(f"Error fetching playlists and tracks: {e}")
-        return []
+        snapshot = limiter.snapshot()
+        fanout_metrics.append(
+            {"provider": "spotify", "playlists": len(playlists), **snapshot}
+        )
+        logger.info(
+            f"Playlist fan-out: {len(playlists)} playlists, "
+            f"{snapshot['requests']} requests, {snapshot['throttled']} "
+            f"throttled, peak concurrency {snapshot['peak']}, final limit "
+            f"{snapshot['limit']}"
+        )
+
+    feeds = []
+    if options.includes("playlists"):
+        feeds.append(feed_playlists())
+    if options.includes("tracks"):
+        feeds.append(
+            pipeline.feed(
+                (1,),
+                filter_added_since(
+                    iter_saved_tracks(client, access_token),
+                    since,
+                    newest_first=True,
+                ),
+                format_spotify_saved_track_rows,
+            )
+        )
+    if options.includes("albums"):
+        feeds.append(
+            pipeline.feed(
+                (2,),
+                filter_added_since(
+                    iter_saved_albums(client, access_token),
+                    since,
+                    newest_first=True,
+                ),
+                format_spotify_saved_album_rows,
+            )
+        )
+
+    # The feeds run as tasks that inherit the cache identity.
+    identity = http_cache_user.set(f"spotify:{user_id}" if user_id else None)
+    try:
+        results = await asyncio.gather(*feeds, return_exceptions=True)
+    finally:
+        http_cache_user.reset(identity)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error fetching Spotify library: {result}")
+
+    return await pipeline.join(spotify_csv_headers)
 
 
 @app.route("/api/spotify/download/<filename>", methods=["GET"])
@@ -401,164 +1492,33 @@ def download_spotify_library(filename: str):
                 mimetype="application/json",
             )
 
-        async def process_and_upload():
-
-            async def gather_data():
-                pt = await fetch_playlists_and_tracks(access_token)
-                t = await get_saved_tracks(access_token)
-                a = await get_saved_albums(access_token)
-                return pt, t, a
-
-            playlists_and_tracks, saved_tracks, saved_albums = (
-                await gather_data()
+        try:
+            options = parse_export_options(request.args, spotify_sources)
+        except ValueError as e:
+            response = {"error": "Bad Request", "message": str(e)}
+            return app.response_class(
+                response=json.dumps(response),
+                status=HTTPStatus.BAD_REQUEST,
+                mimetype="application/json",
             )
 
-            buff = io.StringIO()
-            writer = csv.writer(buff)
-            headers = [
-                "Type",
-                "Playlist Name / Album Name",
-                "Owner / Album Artist",
-                "Playlist URI / Album URI",
-                "Track Name",
-                "Artists",
-                "Album",
-                "Track URI",
-            ]
-
-            rows = []
-
-            for playlist, tracklist in playlists_and_tracks:
-                if not playlist or not tracklist:
-                    continue
-
-                playlist_name = safeget(playlist, "name", "Unknown")
-                owner = safeget(
-                    safeget(playlist, "owner", {}), "display_name", "Unknown"
+        async def process():
+            async with new_http_client() as client:
+                return await export_spotify_library(
+                    client, access_token, serialize_executor, options
                 )
-                playlist_uri = safeget(playlist, "uri", "Unknown")
-
-                for track_item in tracklist:
-                    if not track_item:
-                        continue
-                    track = safeget(track_item, "track", {})
-                    track_name = safeget(track, "name", "Unknown")
-                    artists = "+ ".join(
-                        filter(
-                            None,
-                            (
-                                safeget(artist, "name")
-                                for artist in safeget(track, "artists", [])
-                            ),
-                        )
-                    )
-                    album = safeget(
-                        safeget(track, "album", {}), "name", "Unknown"
-                    )
-                    track_uri = safeget(track, "uri", "Unknown")
-
-                    rows.append(
-                        [
-                            "Playlist",
-                            playlist_name,
-                            owner,
-                            playlist_uri,
-                            track_name,
-                            artists,
-                            album,
-                            track_uri,
-                        ]
-                    )
-
-            for track_item in saved_tracks:
-                if not track_item:
-                    continue
-                track = safeget(track_item, "track", {})
-                track_name = safeget(track, "name", "Unknown")
-                artists = "+ ".join(
-                    filter(
-                        None,
-                        (
-                            safeget(artist, "name")
-                            for artist in safeget(track, "artists", [])
-                        ),
-                    )
-                )
-                album = safeget(safeget(track, "album", {}), "name", "Unknown")
-                track_uri = safeget(track, "uri", "Unknown")
-
-                rows.append(
-                    [
-                        "Saved Track",
-                        "",
-                        "",
-                        "",
-                        track_name,
-                        artists,
-                        album,
-                        track_uri,
-                    ]
-                )
-
-            for album_item in saved_albums:
-                if not album_item:
-                    continue
-                album = safeget(album_item, "album", {})
-                album_name = safeget(album, "name", "Unknown")
-                album_artist = "+ ".join(
-                    filter(
-                        None,
-                        (
-                            safeget(artist, "name")
-                            for artist in safeget(album, "artists", [])
-                        ),
-                    )
-                )
-                album_uri = safeget(album, "uri", "Unknown")
-
-                for track in safeget(safeget(album, "tracks", {}), "items", []):
-                    if not track:
-                        continue
-
-                    track_name = safeget(track, "name", "Unknown")
-                    artists = "+ ".join(
-                        filter(
-                            None,
-                            (
-                                safeget(artist, "name")
-                                for artist in safeget(track, "artists", [])
-                            ),
-                        )
-                    )
-                    track_uri = safeget(track, "uri", "Unknown")
-
-                    rows.append(
-                        [
-                            "Saved Album",
-                            album_name,
-                            album_artist,
-                            album_uri,
-                            track_name,
-                            artists,
-                            album_name,
-                            track_uri,
-                        ]
-                    )
-
-            writer.writerow(headers)
-            writer.writerows(rows)
-            data = buff.getvalue()
 
-            boto.put_object(
-                Bucket=r2_bucket_name,
-                Key=filename,
-                Body=data,
-                ContentType="text/csv",
-            )
+        # Double clicks and retries attach to the export already running.
+        content = export_flights.do(
+            ("spotify", access_token, options), lambda: asyncio.run(process())
+        ).content
 
-            return data
-
-        content = asyncio.run(process_and_upload())
+        boto.put_object(
+            Bucket=r2_bucket_name,
+            Key=filename,
+            Body=content,
+            ContentType="text/csv",
+        )
 
         return send_file(
             BytesIO(content.encode("utf-8")),
@@ -637,6 +1597,136 @@ def apple_callback():
         return redirect("/?error=apple_auth_failed")
 
 
+apple_csv_headers = [
+    "Type",
+    "Playlist Name / Album Name",
+    "Curator / Artist",
+    "Playlist ID / Album ID",
+    "Track Name",
+    "Artists",
+    "Album",
+    "Track ID",
+]
+
+
+def format_apple_music_song(song: AppleMusicResource) -> list:
+    attrs = song.attributes or AppleMusicAttributes()
+    return [attrs.name, attrs.artistName, attrs.albumName, song.id]
+
+
+def format_apple_music_playlist_rows(
+    playlist: AppleMusicResource, items: List[Optional[AppleMusicResource]]
+) -> list:
+    playlist_name = (
+        playlist.attributes.name if playlist.attributes else "Unknown"
+    )
+    prefix = ["Playlist", playlist_name, "", playlist.id]
+    return [prefix + format_apple_music_song(track) for track in items if track]
+
+
+def format_apple_music_song_rows(
+    items: List[Optional[AppleMusicResource]],
+) -> list:
+    prefix = ["Library Song", "", "", ""]
+    return [prefix + format_apple_music_song(song) for song in items if song]
+
+
+def format_apple_music_album_rows(
+    items: List[Optional[AppleMusicResource]],
+) -> list:
+    rows = []
+    for album in items:
+        if not album:
+            continue
+        attrs = album.attributes or AppleMusicAttributes()
+
+        # Note: Apple Music API doesn't return tracks within album objects
+        # You'd need to make additional API calls to get tracks per album
+        rows.append(
+            [
+                "Library Album",
+                attrs.name,
+                attrs.artistName,
+                album.id,
+                "",
+                "",
+                attrs.name,
+                "",
+            ]
+        )
+    return rows
+
+
+async def export_apple_music_library(
+    client,
+    user_token: str,
+    developer_token: str,
+    executor: Executor,
+    options: ExportOptions = ExportOptions(),
+) -> CsvExport:
+    """Crawl an Apple Music library and return it as CSV.
+
+    Sources left out by `options` are never requested.
+    """
+    pipeline = CsvPipeline(executor)
+    since = options.added_since
+
+    async def feed_playlists():
+        playlists = await get_selected_apple_music_playlists(
+            client, user_token, developer_token, options
+        )
+        # Fetch tracks for each playlist
+        for index, playlist in enumerate(playlists):
+            await pipeline.feed(
+                (0, index),
+                filter_added_since(
+                    iter_apple_music_playlist_tracks(
+                        client, user_token, developer_token, playlist.id
+                    ),
+                    since,
+                ),
+                format_apple_music_playlist_rows,
+                playlist,
+            )
+
+    feeds = []
+    if options.includes("playlists"):
+        feeds.append(feed_playlists())
+    if options.includes("songs"):
+        feeds.append(
+            pipeline.feed(
+                (1,),
+                filter_added_since(
+                    iter_apple_music_library_songs(
+                        client, user_token, developer_token
+                    ),
+                    since,
+                ),
+                format_apple_music_song_rows,
+            )
+        )
+    if options.includes("albums"):
+        feeds.append(
+            pipeline.feed(
+                (2,),
+                filter_added_since(
+                    iter_apple_music_library_albums(
+                        client, user_token, developer_token
+                    ),
+                    since,
+                ),
+                format_apple_music_album_rows,
+            )
+        )
+
+    results = await asyncio.gather(*feeds, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error fetching Apple Music library: {result}")
+
+    return await pipeline.join(apple_csv_headers)
+
+
 @app.route("/api/apple/download/<filename>", methods=["GET"])
 @cross_origin(supports_credentials=True)
 def download_apple_music_library(filename: str):
@@ -654,125 +1744,38 @@ def download_apple_music_library(filename: str):
                 mimetype="application/json",
             )
 
-        developer_token = generate_apple_developer_token()
+        try:
+            options = parse_export_options(request.args, apple_music_sources)
+        except ValueError as e:
+            response = {"error": "Bad Request", "message": str(e)}
+            return app.response_class(
+                response=json.dumps(response),
+                status=HTTPStatus.BAD_REQUEST,
+                mimetype="application/json",
+            )
 
-        async def process_and_upload():
-            async def gather_data():
-                playlists = await get_apple_music_playlists(user_token, developer_token)
-                songs = await get_apple_music_library_songs(user_token, developer_token)
-                albums = await get_apple_music_library_albums(user_token, developer_token)
-
-                # Fetch tracks for each playlist
-                playlist_data = []
-                for playlist in playlists:
-                    playlist_id = playlist.get("id")
-                    tracks = await get_apple_music_playlist_tracks(user_token, developer_token, playlist_id)
-                    playlist_data.append((playlist, tracks))
-
-                return playlist_data, songs, albums
-
-            playlists_and_tracks, library_songs, library_albums = await gather_data()
-
-            buff = io.StringIO()
-            writer = csv.writer(buff)
-            headers = [
-                "Type",
-                "Playlist Name / Album Name",
-                "Curator / Artist",
-                "Playlist ID / Album ID",
-                "Track Name",
-                "Artists",
-                "Album",
-                "Track ID",
-            ]
+        developer_token = generate_apple_developer_token()
 
-            rows = []
-
-            # Process playlists
-            for playlist, tracks in playlists_and_tracks:
-                if not playlist or not tracks:
-                    continue
-
-                playlist_name = safeget(safeget(playlist, "attributes", {}), "name", "Unknown")
-                playlist_id = safeget(playlist, "id", "Unknown")
-
-                for track in tracks:
-                    if not track:
-                        continue
-                    attrs = safeget(track, "attributes", {})
-                    track_name = safeget(attrs, "name", "Unknown")
-                    artist_name = safeget(attrs, "artistName", "Unknown")
-                    album_name = safeget(attrs, "albumName", "Unknown")
-                    track_id = safeget(track, "id", "Unknown")
-
-                    rows.append([
-                        "Playlist",
-                        playlist_name,
-                        "",
-                        playlist_id,
-                        track_name,
-                        artist_name,
-                        album_name,
-                        track_id,
-                    ])
-
-            # Process library songs
-            for song in library_songs:
-                if not song:
-                    continue
-                attrs = safeget(song, "attributes", {})
-                track_name = safeget(attrs, "name", "Unknown")
-                artist_name = safeget(attrs, "artistName", "Unknown")
-                album_name = safeget(attrs, "albumName", "Unknown")
-                track_id = safeget(song, "id", "Unknown")
-
-                rows.append([
-                    "Library Song",
-                    "",
-                    "",
-                    "",
-                    track_name,
-                    artist_name,
-                    album_name,
-                    track_id,
-                ])
-
-            # Process library albums
-            for album in library_albums:
-                if not album:
-                    continue
-                attrs = safeget(album, "attributes", {})
-                album_name = safeget(attrs, "name", "Unknown")
-                artist_name = safeget(attrs, "artistName", "Unknown")
-                album_id = safeget(album, "id", "Unknown")
-
-                # Note: Apple Music API doesn't return tracks within album objects
-                # You'd need to make additional API calls to get tracks per album
-                rows.append([
-                    "Library Album",
-                    album_name,
-                    artist_name,
-                    album_id,
-                    "",
-                    "",
-                    album_name,
-                    "",
-                ])
-
-            writer.writerow(headers)
-            writer.writerows(rows)
-            data = buff.getvalue()
-
-            boto.put_object(
-                Bucket=r2_bucket_name,
-                Key=filename,
-                Body=data,
-                ContentType="text/csv",
-            )
+        async def process():
+            async with new_http_client() as client:
+                return await export_apple_music_library(
+                    client,
+                    user_token,
+                    developer_token,
+                    serialize_executor,
+                    options,
+                )
 
-            return data
+        content = export_flights.do(
+            ("apple", user_token, options), lambda: asyncio.run(process())
+        ).content
 
-        content = asyncio.run(process_and_upload())
+        boto.put_object(
+            Bucket=r2_bucket_name,
+            Key=filename,
+            Body=content,
+            ContentType="text/csv",
+        )
 
         return send_file(
             BytesIO(content.encode("utf-8")),
@@ -0,0 +1,266 @@
+"""Microbenchmark for decoding provider pages.
+
+Compares the generic stdlib path (``json.loads`` plus ``safeget`` walks)
+with the typed decoders used by the exporter:
+
+    python -m api.bench_decode --kind spotify-tracks recorded/tracks-*.json
+
+Pass recorded API responses (one page per file) to measure real payloads;
+without files a synthetic 50-item page is used.
+"""
+
+import argparse
+import json
+import time
+from typing import *
+
+from api.app import (
+    AppleMusicPage,
+    SpotifySavedAlbumPage,
+    SpotifyTrackPage,
+    decode_payload,
+    format_apple_music_song_rows,
+    format_spotify_saved_album_rows,
+    format_spotify_saved_track_rows,
+    msgspec,
+    orjson,
+    payload_converter,
+    safeget,
+    write_csv_rows,
+)
+
+
+def dict_artist_names(item: dict) -> str:
+    return "+ ".join(
+        filter(
+            None,
+            (
+                safeget(artist, "name")
+                for artist in safeget(item, "artists", [])
+            ),
+        )
+    )
+
+
+def dict_spotify_track_rows(data: dict) -> str:
+    rows = []
+    for track_item in data.get("items", []):
+        if not track_item:
+            continue
+        track = safeget(track_item, "track", {})
+        rows.append(
+            [
+                "Saved Track",
+                "",
+                "",
+                "",
+                safeget(track, "name", "Unknown"),
+                dict_artist_names(track),
+                safeget(safeget(track, "album", {}), "name", "Unknown"),
+                safeget(track, "uri", "Unknown"),
+            ]
+        )
+    return write_csv_rows(rows)
+
+
+def dict_spotify_album_rows(data: dict) -> str:
+    rows = []
+    for album_item in data.get("items", []):
+        if not album_item:
+            continue
+        album = safeget(album_item, "album", {})
+        album_name = safeget(album, "name", "Unknown")
+        album_artist = dict_artist_names(album)
+        album_uri = safeget(album, "uri", "Unknown")
+        for track in safeget(safeget(album, "tracks", {}), "items", []):
+            if not track:
+                continue
+            rows.append(
+                [
+                    "Saved Album",
+                    album_name,
+                    album_artist,
+                    album_uri,
+                    safeget(track, "name", "Unknown"),
+                    dict_artist_names(track),
+                    album_name,
+                    safeget(track, "uri", "Unknown"),
+                ]
+            )
+    return write_csv_rows(rows)
+
+
+def dict_apple_rows(data: dict) -> str:
+    rows = []
+    for song in data.get("data", []):
+        if not song:
+            continue
+        attrs = safeget(song, "attributes", {})
+        rows.append(
+            [
+                "Library Song",
+                "",
+                "",
+                "",
+                safeget(attrs, "name", "Unknown"),
+                safeget(attrs, "artistName", "Unknown"),
+                safeget(attrs, "albumName", "Unknown"),
+                safeget(song, "id", "Unknown"),
+            ]
+        )
+    return write_csv_rows(rows)
+
+
+# kind -> (page type, typed formatter, dict formatter)
+kinds = {
+    "spotify-tracks": (
+        SpotifyTrackPage,
+        format_spotify_saved_track_rows,
+        dict_spotify_track_rows,
+    ),
+    "spotify-albums": (
+        SpotifySavedAlbumPage,
+        format_spotify_saved_album_rows,
+        dict_spotify_album_rows,
+    ),
+    "apple": (AppleMusicPage, format_apple_music_song_rows, dict_apple_rows),
+}
+
+
+def synthetic_page(kind: str, size: int = 50) -> bytes:
+    markets = ["US", "GB", "DE", "FR", "JP", "BR", "CA", "AU"] * 23
+    images = [
+        {"url": "https://i.scdn.co/image/ab67616d", "height": h, "width": h}
+        for h in (640, 300, 64)
+    ]
+
+    def artist(i: int) -> dict:
+        return {
+            "id": f"artist{i}",
+            "name": f"Artist {i}",
+            "type": "artist",
+            "uri": f"spotify:artist:{i}",
+            "href": f"https://api.spotify.com/v1/artists/{i}",
+            "external_urls": {"spotify": f"https://open.spotify.com/{i}"},
+        }
+
+    def track(i: int) -> dict:
+        return {
+            "id": f"track{i}",
+            "name": f"Track {i}",
+            "uri": f"spotify:track:{i}",
+            "duration_ms": 200000 + i,
+            "explicit": False,
+            "popularity": i % 100,
+            "available_markets": markets,
+            "artists": [artist(i), artist(i + 1)],
+            "album": {
+                "id": f"album{i}",
+                "name": f"Album {i}",
+                "images": images,
+                "available_markets": markets,
+                "artists": [artist(i)],
+            },
+        }
+
+    if kind == "spotify-tracks":
+        items = [
+            {"added_at": "2024-01-01T00:00:00Z", "track": track(i)}
+            for i in range(size)
+        ]
+        return json.dumps({"items": items, "next": None}).encode()
+    if kind == "spotify-albums":
+        items = [
+            {
+                "added_at": "2024-01-01T00:00:00Z",
+                "album": {
+                    "name": f"Album {i}",
+                    "uri": f"spotify:album:{i}",
+                    "images": images,
+                    "available_markets": markets,
+                    "artists": [artist(i)],
+                    "tracks": {"items": [track(j) for j in range(12)]},
+                },
+            }
+            for i in range(size)
+        ]
+        return json.dumps({"items": items, "next": None}).encode()
+    data = [
+        {
+            "id": f"i.{i}",
+            "type": "library-songs",
+            "href": f"/v1/me/library/songs/i.{i}",
+            "attributes": {
+                "name": f"Song {i}",
+                "artistName": f"Artist {i}",
+                "albumName": f"Album {i}",
+                "genreNames": ["Pop"],
+                "trackNumber": i,
+                "durationInMillis": 200000,
+                "releaseDate": "2020-01-01",
+                "artwork": {"width": 1200, "height": 1200, "url": "x"},
+                "playParams": {"id": f"i.{i}", "kind": "song"},
+            },
+        }
+        for i in range(size)
+    ]
+    return json.dumps({"data": data, "next": None}).encode()
+
+
+def timeit(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m api.bench_decode")
+    parser.add_argument(
+        "--kind", choices=sorted(kinds), default="spotify-tracks"
+    )
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("payloads", nargs="*", help="Recorded JSON pages")
+    args = parser.parse_args(argv)
+
+    page_type, typed_rows, dict_rows = kinds[args.kind]
+    if args.payloads:
+        pages = []
+        for path in args.payloads:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+    else:
+        pages = [synthetic_page(args.kind)]
+
+    convert = payload_converter(page_type)
+    variants = {
+        "json + dicts": lambda p: dict_rows(json.loads(p)),
+        "json + typed": lambda p: write_csv_rows(
+            typed_rows(convert(json.loads(p)).items)
+        ),
+    }
+    if orjson:
+        variants["orjson + dicts"] = lambda p: dict_rows(orjson.loads(p))
+        variants["orjson + typed"] = lambda p: write_csv_rows(
+            typed_rows(convert(orjson.loads(p)).items)
+        )
+    if msgspec:
+        variants["msgspec typed"] = lambda p: write_csv_rows(
+            typed_rows(decode_payload(p, page_type).items)
+        )
+
+    size = sum(len(p) for p in pages)
+    print(f"{len(pages)} page(s), {size / 1024:.1f} KiB, kind={args.kind}")
+    baseline = None
+    for name, run in variants.items():
+        elapsed = timeit(lambda: [run(p) for p in pages], args.repeat)
+        baseline = baseline or elapsed
+        print(
+            f"{name:>16}: {elapsed / len(pages) * 1e6:9.1f} us/page "
+            f"{size / elapsed / 1e6:8.1f} MB/s {baseline / elapsed:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
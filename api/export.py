@@ -0,0 +1,259 @@
+"""Batch Spotify library export.
+
+Runs many exports in one process instead of one HTTP request per user:
+
+    python -m api.export tokens.txt --prefix nightly/2024-01-01/
+
+``tokens.txt`` holds one Spotify access token per line. Blank lines and
+lines starting with ``#`` are ignored.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import *
+
+import httpx
+
+from api.app import (
+    ExportOptions,
+    boto,
+    export_flights,
+    export_spotify_library,
+    new_http_client,
+    parse_export_options,
+    r2_bucket_name,
+    spotify_sources,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket shared by every request made through one client."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, *args) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def read_tokens(path: str) -> List[str]:
+    with open(path) as f:
+        return [
+            line.strip()
+            for line in f
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+
+def upload(key: str, data: str) -> None:
+    boto.put_object(
+        Bucket=r2_bucket_name,
+        Key=key,
+        Body=data,
+        ContentType="text/csv",
+    )
+
+
+async def export_one(
+    client: httpx.AsyncClient,
+    serializers: ProcessPoolExecutor,
+    uploaders: ThreadPoolExecutor,
+    index: int,
+    access_token: str,
+    key: str,
+    options: ExportOptions,
+) -> dict:
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    # Pages are serialized on the process pool while the crawl continues.
+    # Duplicate tokens in the input share a single crawl.
+    export = await export_flights.do_async(
+        ("spotify", access_token, options),
+        export_spotify_library,
+        client,
+        access_token,
+        serializers,
+        options,
+    )
+    exported = time.monotonic()
+    await loop.run_in_executor(uploaders, upload, key, export.content)
+    finished = time.monotonic()
+
+    rows = export.rows
+    elapsed = finished - started
+    stats = {
+        "index": index,
+        "key": key,
+        "rows": rows,
+        "bytes": len(export.content.encode("utf-8")),
+        "export": exported - started,
+        "upload": finished - exported,
+        "elapsed": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0,
+    }
+    logger.info(
+        f"Exported #{index} to {key}: {rows} rows, {stats['bytes']} bytes in "
+        f"{elapsed:.2f}s (export {stats['export']:.2f}s, upload "
+        f"{stats['upload']:.2f}s, {stats['rows_per_sec']:.0f} rows/s)"
+    )
+    return stats
+
+
+async def export_all(
+    tokens: List[str], options: ExportOptions, args: argparse.Namespace
+) -> list:
+    limiter = RateLimiter(args.rate, args.burst)
+    limits = httpx.Limits(
+        max_connections=args.connections,
+        max_keepalive_connections=args.connections,
+    )
+    users = asyncio.Semaphore(args.concurrency)
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers
+    ) as serializers, ThreadPoolExecutor(max_workers=args.uploads) as uploaders:
+        async with new_http_client(
+            limits=limits,
+            timeout=args.timeout,
+            event_hooks={"request": [limiter.acquire]},
+        ) as client:
+
+            async def run(index: int, access_token: str):
+                key = f"{args.prefix}libx-spotify-export-{uuid.uuid4()}.csv"
+                async with users:
+                    return await export_one(
+                        client,
+                        serializers,
+                        uploaders,
+                        index,
+                        access_token,
+                        key,
+                        options,
+                    )
+
+            return await asyncio.gather(
+                *(run(i, token) for i, token in enumerate(tokens)),
+                return_exceptions=True,
+            )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m api.export",
+        description="Export many Spotify libraries to R2 in one process.",
+    )
+    parser.add_argument("tokens", help="File with one access token per line")
+    parser.add_argument(
+        "--prefix", default="", help="R2 key prefix for the exported files"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Number of users exported at the same time",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=32,
+        help="Size of the shared HTTP connection pool",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=20.0,
+        help="Global request rate limit across all users (requests/s)",
+    )
+    parser.add_argument(
+        "--burst", type=int, default=20, help="Rate limiter burst size"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="CSV serialization processes (defaults to the CPU count)",
+    )
+    parser.add_argument(
+        "--uploads", type=int, default=8, help="Concurrent R2 uploads"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=30.0, help="Per request timeout (s)"
+    )
+    parser.add_argument(
+        "--sources",
+        help=f"Comma separated sources to export ({','.join(spotify_sources)})",
+    )
+    parser.add_argument(
+        "--playlists", help="Comma separated playlist IDs to export"
+    )
+    parser.add_argument(
+        "--owned",
+        action="store_true",
+        help="Only export playlists owned by the user",
+    )
+    parser.add_argument(
+        "--since", help="Only export items added on or after this ISO date"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        options = parse_export_options(
+            {
+                "sources": args.sources,
+                "playlists": args.playlists,
+                "owned": "true" if args.owned else None,
+                "since": args.since,
+            },
+            spotify_sources,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    tokens = read_tokens(args.tokens)
+    if not tokens:
+        logger.error(f"No tokens found in {args.tokens}")
+        return 1
+
+    started = time.monotonic()
+    results = asyncio.run(export_all(tokens, options, args))
+    elapsed = time.monotonic() - started
+
+    failed = 0
+    rows = 0
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            failed += 1
+            logger.error(f"Export #{index} failed: {result}")
+            continue
+        rows += result["rows"]
+
+    logger.info(
+        f"Exported {len(tokens) - failed}/{len(tokens)} libraries, {rows} rows "
+        f"in {elapsed:.2f}s ({rows / elapsed if elapsed else 0.0:.0f} rows/s)"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+import os
+
+# api.app reads its configuration at import time.
+for name in (
+    "SPOTIFY_CLIENT_ID",
+    "SPOTIFY_CLIENT_SECRET",
+    "SPOTIFY_REDIRECT_URI",
+    "R2_BUCKET_NAME",
+    "R2_ACCESS_KEY_ID",
+    "R2_ACCOUNT_ID",
+    "R2_SECRET_ACCESS_KEY",
+):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("LIBX_HTTP_CACHE_MAX_BYTES", "0")
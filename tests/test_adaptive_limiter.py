@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import pytest
+
+from api.app import AdaptiveLimiter
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> list:
+    """Record backoff delays instead of waiting them out."""
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record(delay, *args):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", record)
+    return delays
+
+
+def limited_get(limiter: AdaptiveLimiter, upstream) -> httpx.Response:
+    async def get():
+        transport = httpx.MockTransport(upstream)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await limiter.get(client, "https://api.spotify.com/v1", {})
+
+    return asyncio.run(get())
+
+
+def test_timeouts_back_off_before_retrying(sleeps):
+    attempts = []
+
+    def upstream(request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200)
+
+    limiter = AdaptiveLimiter()
+    assert limited_get(limiter, upstream).status_code == 200
+    assert sleeps == [1, 2]
+    assert limiter.throttled == 2
+
+
+def test_timeouts_are_raised_once_retries_run_out(sleeps):
+    attempts = []
+
+    def upstream(request):
+        attempts.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    with pytest.raises(httpx.ReadTimeout):
+        limited_get(AdaptiveLimiter(retries=2), upstream)
+    assert len(attempts) == 3
+    assert sleeps == [1, 2]
+
+
+def test_throttled_requests_wait_for_retry_after(sleeps):
+    attempts = []
+
+    def upstream(request):
+        attempts.append(request)
+        if len(attempts) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0.5"})
+        if len(attempts) == 2:
+            return httpx.Response(429)
+        return httpx.Response(200)
+
+    limiter = AdaptiveLimiter()
+    assert limited_get(limiter, upstream).status_code == 200
+    assert sleeps == [0.5, 2]
+    assert limiter.limit < 4
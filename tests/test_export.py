@@ -0,0 +1,36 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from api import export
+from api.app import ExportOptions
+
+
+def test_export_one_fails_without_uploading_when_the_token_is_dead(
+    monkeypatch,
+):
+    uploads = []
+    monkeypatch.setattr(export, "upload", lambda key, data: uploads.append(key))
+
+    def upstream(request):
+        return httpx.Response(401, json={"error": "token expired"})
+
+    async def run():
+        transport = httpx.MockTransport(upstream)
+        async with httpx.AsyncClient(transport=transport) as client:
+            with ThreadPoolExecutor() as pool:
+                return await export.export_one(
+                    client,
+                    pool,
+                    pool,
+                    0,
+                    "expired-token",
+                    "libx-spotify-export.csv",
+                    ExportOptions(),
+                )
+
+    with pytest.raises(RuntimeError, match="Spotify user"):
+        asyncio.run(run())
+    assert uploads == []
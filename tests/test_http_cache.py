@@ -0,0 +1,132 @@
+import asyncio
+import os
+import stat
+from typing import *
+
+import httpx
+import pytest
+
+from api.app import CachingTransport, DiskLRUCache, http_cache_user
+
+url = "https://api.spotify.com/v1/me/tracks"
+
+
+class Upstream:
+    """Serves one body per user, revalidated by ETag."""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        user = request.headers.get("X-User", "anonymous")
+        etag = f'"{user}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(
+            200, headers={"ETag": etag}, json={"items": [user]}
+        )
+
+
+@pytest.fixture
+def cache(tmp_path) -> DiskLRUCache:
+    return DiskLRUCache(str(tmp_path / "http"), max_bytes=1024 * 1024)
+
+
+def fetch(
+    cache: DiskLRUCache,
+    upstream: Upstream,
+    user: Optional[str] = None,
+    headers: Optional[dict] = None,
+) -> httpx.Response:
+    async def get():
+        # The identity an export would set once /me has resolved.
+        http_cache_user.set(user)
+        transport = CachingTransport(httpx.MockTransport(upstream), cache)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.get(
+                url, headers={"X-User": user or "anonymous", **(headers or {})}
+            )
+
+    return asyncio.run(get())
+
+
+def entries(cache: DiskLRUCache) -> list:
+    return os.listdir(cache.path)
+
+
+def test_not_modified_is_served_from_the_stored_body(cache):
+    upstream = Upstream()
+    first = fetch(cache, upstream, "spotify:a")
+    second = fetch(cache, upstream, "spotify:a")
+
+    assert upstream.requests[1].headers["If-None-Match"] == '"spotify:a"'
+    assert second.status_code == 200
+    assert second.json() == first.json() == {"items": ["spotify:a"]}
+    assert second.headers["ETag"] == '"spotify:a"'
+
+
+def test_users_never_share_an_entry(cache):
+    upstream = Upstream()
+    fetch(cache, upstream, "spotify:a")
+    response = fetch(cache, upstream, "spotify:b")
+
+    assert "If-None-Match" not in upstream.requests[1].headers
+    assert response.json() == {"items": ["spotify:b"]}
+    assert len(entries(cache)) == 2
+
+
+def test_requests_without_a_user_bypass_the_cache(cache):
+    upstream = Upstream()
+    fetch(cache, upstream)
+    fetch(cache, upstream)
+
+    assert all("If-None-Match" not in r.headers for r in upstream.requests)
+    assert entries(cache) == []
+
+
+def test_apple_entries_survive_a_new_developer_token(cache):
+    upstream = Upstream()
+    for developer_token in ("first", "second"):
+        response = fetch(
+            cache,
+            upstream,
+            headers={
+                "Authorization": f"Bearer {developer_token}",
+                "Music-User-Token": "user-token",
+            },
+        )
+
+    assert "If-None-Match" in upstream.requests[1].headers
+    assert response.status_code == 200
+
+
+def test_eviction_keeps_the_total_under_max_bytes(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "http"), max_bytes=1000)
+    meta = {"etag": '"v1"'}
+    for key in "abcde":
+        cache.set(key, meta, b"x" * 250)
+        # Keep "a" recently used so the others are evicted first.
+        assert cache.get("a") is not None
+
+    sizes = [
+        os.path.getsize(os.path.join(cache.path, k)) for k in entries(cache)
+    ]
+    assert sum(sizes) == cache._total <= 1000
+    assert sorted(entries(cache)) == ["a", "d", "e"]
+
+    # A restarted process rebuilds recency from mtimes, oldest first.
+    for mtime, key in enumerate(["d", "e", "a"], start=1):
+        os.utime(os.path.join(cache.path, key), (mtime, mtime))
+    reopened = DiskLRUCache(cache.path, max_bytes=600)
+    assert reopened._total <= 600
+    assert sorted(entries(reopened)) == ["a", "e"]
+
+
+def test_entries_are_only_readable_by_the_owner(cache):
+    fetch(cache, Upstream(), "spotify:a")
+
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o700
+    (entry,) = entries(cache)
+    mode = os.stat(os.path.join(cache.path, entry)).st_mode
+    assert stat.S_IMODE(mode) == 0o600
@@ -0,0 +1,168 @@
+import asyncio
+import types
+from concurrent.futures import Executor, Future
+from typing import *
+
+import httpx
+import pytest
+
+from api import app
+from api.app import ExportOptions, export_spotify_library, fanout_metrics
+
+playlists = 100
+pages_per_playlist = 3
+page_size = 10
+
+
+class MockSpotify:
+    """Spotify API stand-in that degrades once too many requests overlap.
+
+    Above `capacity` concurrent requests it answers 429 with Retry-After.
+    Past `knee` each extra request in flight adds `latency` to every
+    response, like a server queueing work.
+    """
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        knee: Optional[int] = None,
+        latency: float = 0.01,
+        retry_after: float = 0.05,
+    ):
+        self.capacity = capacity
+        self.knee = knee
+        self.latency = latency
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.peak = 0
+        self.throttled = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path == "/v1/me":
+            return httpx.Response(200, json={"id": "me"})
+        if path == "/v1/me/playlists":
+            items = [
+                {"id": f"p{i}", "name": f"Playlist {i}", "uri": f"p:{i}"}
+                for i in range(playlists)
+            ]
+            return httpx.Response(200, json={"items": items})
+        return await self.tracks(request)
+
+    async def tracks(self, request: httpx.Request) -> httpx.Response:
+        self.inflight += 1
+        self.peak = max(self.peak, self.inflight)
+        try:
+            # Rejections cost a round trip too, so they count as in flight.
+            if self.capacity and self.inflight > self.capacity:
+                self.throttled += 1
+                await asyncio.sleep(self.latency)
+                return httpx.Response(
+                    429, headers={"Retry-After": str(self.retry_after)}
+                )
+            queued = self.inflight - self.knee + 1 if self.knee else 1
+            await asyncio.sleep(self.latency * max(1, queued))
+
+            page = int(request.url.params.get("page", 0))
+            items = [
+                {"track": {"name": f"Track {page}.{i}", "uri": f"t:{i}"}}
+                for i in range(page_size)
+            ]
+            next_url = (
+                request.url.copy_set_param("page", page + 1)
+                if page + 1 < pages_per_playlist
+                else None
+            )
+            return httpx.Response(
+                200,
+                json={"items": items, "next": next_url and str(next_url)},
+            )
+        finally:
+            self.inflight -= 1
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """Event loop whose clock jumps to the next timer instead of sleeping.
+
+    Time only moves once every task is waiting, so the mock's latencies and
+    the limiter's measurements don't depend on how busy the machine is.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._now = 0.0
+        select = self._selector.select
+
+        def poll(timeout=None):
+            events = select(0)
+            if not events and timeout:
+                self._now += timeout
+            return events
+
+        self._selector.select = poll
+
+    def time(self) -> float:
+        return self._now
+
+
+class InlineExecutor(Executor):
+    """Serializes pages on the loop thread, keeping the run deterministic."""
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+@pytest.fixture(autouse=True)
+def virtual_monotonic(monkeypatch):
+    # The limiter times requests with time.monotonic; read the loop's clock.
+    clock = types.SimpleNamespace(
+        monotonic=lambda: asyncio.get_running_loop().time()
+    )
+    monkeypatch.setattr(app, "time", clock)
+
+
+def export(server: MockSpotify):
+    async def run():
+        transport = httpx.MockTransport(server)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await export_spotify_library(
+                client,
+                "token",
+                InlineExecutor(),
+                ExportOptions(sources=("playlists",)),
+            )
+
+    with asyncio.Runner(loop_factory=VirtualClockLoop) as runner:
+        return runner.run(run())
+
+
+def test_fanout_stays_near_capacity_of_a_throttling_server():
+    server = MockSpotify(capacity=8)
+    result = export(server)
+
+    # Every throttled page is retried, so nothing is lost.
+    assert result.rows == playlists * pages_per_playlist * page_size
+    # An unbounded fan-out would put all 100 playlists in flight at once.
+    assert server.peak <= 12
+    # Unbounded, roughly two thirds of the requests get a 429.
+    assert server.throttled < playlists * pages_per_playlist // 3
+    metrics = fanout_metrics[-1]
+    assert metrics["playlists"] == playlists
+    assert metrics["throttled"] == server.throttled
+    assert metrics["peak"] == server.peak
+
+
+def test_fanout_backs_off_when_latency_climbs():
+    server = MockSpotify(knee=6)
+    result = export(server)
+
+    assert result.rows == playlists * pages_per_playlist * page_size
+    assert server.throttled == 0
+    # The limit would climb toward the maximum of 32 on latency alone
+    # unless slow responses pulled it back.
+    assert server.peak <= 12
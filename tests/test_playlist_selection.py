@@ -0,0 +1,63 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from api.app import (
+    ExportOptions,
+    export_apple_music_library,
+    export_spotify_library,
+)
+
+# Unknown IDs, like a crafted path, come back as playlists without an ID.
+options = ExportOptions(
+    sources=("playlists",), playlist_ids=("../me", "good", "p.good")
+)
+track_page = {"items": [{"track": {"name": "Song", "uri": "spotify:track:1"}}]}
+
+
+def spotify(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path == "/v1/me":
+        return httpx.Response(200, json={"id": "me"})
+    if path == "/v1/playlists/good":
+        return httpx.Response(200, json={"id": "good", "name": "Good"})
+    if path == "/v1/playlists/good/tracks":
+        return httpx.Response(200, json=track_page)
+    # A body that decodes to a playlist without an ID.
+    return httpx.Response(200, json={"name": "No ID"})
+
+
+def apple(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path == "/v1/me/library/playlists/p.good":
+        playlist = {"id": "p.good", "attributes": {"name": "Good"}}
+        return httpx.Response(200, json={"data": [playlist]})
+    if path == "/v1/me/library/playlists/p.good/tracks":
+        song = {"id": "i.1", "attributes": {"name": "Song"}}
+        return httpx.Response(200, json={"data": [song]})
+    return httpx.Response(200, json={"data": [{"id": None}]})
+
+
+def run(upstream, export, *args):
+    async def main():
+        transport = httpx.MockTransport(upstream)
+        async with httpx.AsyncClient(transport=transport) as client:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                return await export(client, *args, executor, options)
+
+    return asyncio.run(main())
+
+
+def test_spotify_playlists_without_an_id_are_skipped():
+    result = run(spotify, export_spotify_library, "token")
+
+    assert result.rows == 1
+    assert "Good" in result.content
+
+
+def test_apple_music_playlists_without_an_id_are_skipped():
+    result = run(apple, export_apple_music_library, "user", "developer")
+
+    assert result.rows == 1
+    assert "Good" in result.content
@@ -0,0 +1,174 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
+
+import httpx
+import pytest
+
+from api.app import CoalescingTransport, SingleFlight
+
+
+class CountingFlight(SingleFlight):
+    """Signals every caller that has attached to a flight."""
+
+    def __init__(self):
+        super().__init__()
+        self.joined = threading.Semaphore(0)
+
+    def _join(self, key):
+        joined = super()._join(key)
+        self.joined.release()
+        return joined
+
+
+def wait_joined(flights: CountingFlight, callers: int) -> None:
+    for _ in range(callers):
+        assert flights.joined.acquire(timeout=5)
+
+
+def test_do_runs_concurrent_identical_calls_once():
+    flights = CountingFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(threading.get_ident())
+        assert release.wait(5)
+        return "csv"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flights.do, "key", work) for _ in range(4)]
+        # Everyone attaches while the leader is still running.
+        wait_joined(flights, 4)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert results == ["csv"] * 4
+    assert len(calls) == 1
+
+
+def test_do_propagates_leader_exception_to_followers():
+    flights = CountingFlight()
+    release = threading.Event()
+
+    def work():
+        assert release.wait(5)
+        raise ValueError("upstream failed")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(flights.do, "key", work) for _ in range(3)]
+        wait_joined(flights, 3)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError, match="upstream failed"):
+                future.result(timeout=5)
+
+
+def test_do_runs_again_once_the_flight_has_landed():
+    flights = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        raise ValueError("boom")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            flights.do("key", work)
+    assert flights.do("key", lambda: "ok") == "ok"
+    assert len(calls) == 2
+
+
+def test_do_async_runs_concurrent_identical_calls_once():
+    flights = SingleFlight()
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        return await asyncio.gather(
+            *(flights.do_async("key", work, i) for i in range(3)),
+            flights.do_async("other", work, 3),
+        )
+
+    assert asyncio.run(main()) == [0, 0, 0, 3]
+    assert calls == [0, 3]
+
+
+def test_do_async_propagates_leader_exception_to_followers():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(
+            *(flights.do_async("key", work) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def coalesced_get(flights: SingleFlight, upstream: Callable) -> Callable:
+    async def get():
+        transport = CoalescingTransport(httpx.MockTransport(upstream), flights)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.get(
+                "https://api.spotify.com/v1/me/tracks",
+                headers={"Authorization": "Bearer token"},
+            )
+
+    # Each call runs on its own event loop, like a download request.
+    return lambda: asyncio.run(get())
+
+
+def test_coalescing_transport_shares_response_across_event_loops():
+    flights = CountingFlight()
+    release = threading.Event()
+    calls = []
+
+    async def upstream(request):
+        calls.append(request.url)
+        await asyncio.to_thread(release.wait, 5)
+        return httpx.Response(
+            200, headers={"ETag": '"v1"'}, content=b'{"items": []}'
+        )
+
+    get = coalesced_get(flights, upstream)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(get) for _ in range(2)]
+        wait_joined(flights, 2)
+        release.set()
+        responses = [future.result(timeout=5) for future in futures]
+
+    assert len(calls) == 1
+    for response in responses:
+        assert response.status_code == 200
+        assert response.headers["ETag"] == '"v1"'
+        assert response.json() == {"items": []}
+    assert responses[0].request is not responses[1].request
+
+
+def test_coalescing_transport_propagates_errors_across_event_loops():
+    flights = CountingFlight()
+    release = threading.Event()
+
+    async def upstream(request):
+        await asyncio.to_thread(release.wait, 5)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    get = coalesced_get(flights, upstream)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(get) for _ in range(2)]
+        wait_joined(flights, 2)
+        release.set()
+        for future in futures:
+            with pytest.raises(httpx.ConnectError):
+                future.result(timeout=5)